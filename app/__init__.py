@@ -4,6 +4,7 @@ import asyncpg
 import os
 import logging
 from datetime import timedelta
+from .db import prewarm_connection
 
 # Логирование
 logging.basicConfig(level=logging.INFO)
@@ -32,6 +33,19 @@ def create_app():
                 port=int(os.getenv("DB_PORT")),
                 min_size=1,
                 max_size=10,
+                init=prewarm_connection,
+            )
+            # Отдельный пул для поиска товаров: запрос поиска сильно зависит от
+            # параметров, поэтому план всегда строится под конкретные значения
+            app.search_pool = await asyncpg.create_pool(
+                database=os.getenv("DB_NAME"),
+                user=os.getenv("DB_USER"),
+                password=os.getenv("DB_PASSWORD"),
+                host=os.getenv("DB_HOST"),
+                port=int(os.getenv("DB_PORT")),
+                min_size=1,
+                max_size=5,
+                server_settings={"plan_cache_mode": "force_custom_plan"},
             )
             logger.info("Пул соединений с базой данных успешно создан.")
         except Exception as e:
@@ -45,6 +59,7 @@ def create_app():
         """
         try:
             await app.db_pool.close()
+            await app.search_pool.close()
             logger.info("Пул соединений с базой данных закрыт.")
         except Exception as e:
             logger.error(f"Ошибка при закрытии пула соединений: {e}")
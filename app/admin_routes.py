@@ -2,6 +2,7 @@ from quart import Blueprint, render_template, request, redirect, url_for, flash,
 from app.db import *
 import os
 import datetime
+import uuid
 from app.utils import *
 from dotenv import load_dotenv
 import glob
@@ -11,6 +12,9 @@ admin = Blueprint('admin', __name__, url_prefix='/admin')
 
 load_dotenv()
 
+# Количество строк на странице в списках товаров и заказов
+PAGE_SIZE = 50
+
 @admin.route('/')
 @admin_required
 async def admin_dashboard():
@@ -40,7 +44,7 @@ async def manage_products():
             await flash('Товар добавлен.', 'success')
         elif action == 'edit':
             # Редактирование существующего товара
-            product_id = form.get('product_id')
+            product_id = uuid.UUID(form.get('product_id'))
             name = form.get('name')
             description = form.get('description')
             category_id = form.get('category_id') or None
@@ -51,15 +55,29 @@ async def manage_products():
             await flash('Товар обновлен.', 'success')
         elif action == 'delete':
             # Удаление товара
-            product_id = form.get('product_id')
+            product_id = uuid.UUID(form.get('product_id'))
             await delete_product(current_app.db_pool, product_id)
             await flash('Товар удален.', 'success')
         return redirect(url_for('admin.manage_products'))
 
-    # GET-запрос: отображаем список товаров и категорий
-    products = await get_all_products_with_categories(current_app.db_pool)
+    # GET-запрос: отображаем страницу списка товаров и категории
+    after_name = request.args.get('after_name')
+    try:
+        after_id = uuid.UUID(request.args.get('after_id'))
+    except (TypeError, ValueError):
+        # Некорректный курсор: показываем первую страницу
+        after_name, after_id = None, None
+    if after_name is None:
+        after_id = None
+    products = await get_all_products_with_categories(current_app.db_pool, PAGE_SIZE, after_name, after_id)
     categories = await get_all_categories(current_app.db_pool)
-    return await render_template('admin/manage_products.html', products=products, categories=categories)
+    return await render_template(
+        'admin/manage_products.html',
+        products=products,
+        categories=categories,
+        has_next=len(products) == PAGE_SIZE,
+        is_first_page=after_name is None
+    )
 
 @admin.route('/orders', methods=['GET', 'POST'])
 @admin_required
@@ -71,13 +89,26 @@ async def manage_orders():
         form = await request.form
         order_id = form.get('order_id')
         new_status = form.get('status')
-        await update_order_status(current_app.db_pool, order_id, new_status)
-        await flash('Статус заказа обновлен.', 'success')
+        if await update_order_status(current_app.db_pool, order_id, new_status):
+            await flash('Статус заказа обновлен.', 'success')
+        else:
+            await flash('Заказ не найден или статус не изменился.', 'warning')
         return redirect(url_for('admin.manage_orders'))
 
-    # GET-запрос: отображаем список заказов
-    orders = await get_all_orders(current_app.db_pool)
-    return await render_template('admin/manage_orders.html', orders=orders)
+    # GET-запрос: отображаем страницу списка заказов
+    try:
+        after_date = datetime.datetime.fromisoformat(request.args.get('after_date'))
+        after_id = uuid.UUID(request.args.get('after_id'))
+    except (TypeError, ValueError):
+        # Курсор не передан или некорректен: показываем первую страницу
+        after_date, after_id = None, None
+    orders = await get_all_orders(current_app.db_pool, PAGE_SIZE, after_date, after_id)
+    return await render_template(
+        'admin/manage_orders.html',
+        orders=orders,
+        has_next=len(orders) == PAGE_SIZE,
+        is_first_page=after_date is None
+    )
 
 @admin.route('/backup', methods=['GET'])
 @admin_required
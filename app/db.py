@@ -1,343 +1,451 @@
+import asyncio
 import asyncpg
 import uuid
-import bcrypt
 import logging
+from contextlib import asynccontextmanager
+from typing import Union
 
 logger = logging.getLogger(__name__)
 
-async def get_all_products(pool):
-    """
-    Получить список всех продуктов.
-    """
-    async with pool.acquire() as conn:
+# Функции модуля принимают либо пул, либо уже взятое из него соединение:
+# так вспомогательные функции можно вызывать внутри открытого соединения
+# или транзакции без повторного pool.acquire()
+ConnOrPool = Union[asyncpg.pool.Pool, asyncpg.Connection]
+
+@asynccontextmanager
+async def _acquire(conn_or_pool: ConnOrPool):
+    """
+    Вернуть переданное соединение или взять новое из пула.
+    """
+    if isinstance(conn_or_pool, asyncpg.Connection):
+        yield conn_or_pool
+    else:
+        async with conn_or_pool.acquire() as conn:
+            yield conn
+
+# Кэш ролей {name: role_id}: таблица roles практически не меняется,
+# поэтому загружаем её один раз на процесс
+_ROLE_CACHE: dict[str, int] = {}
+_ROLE_CACHE_LOCK = asyncio.Lock()
+
+async def _ensure_roles(conn_or_pool: ConnOrPool):
+    """
+    Загрузить роли в кэш, если он ещё пуст.
+    """
+    if _ROLE_CACHE:
+        return
+    async with _ROLE_CACHE_LOCK:
+        if _ROLE_CACHE:
+            return
+        async with _acquire(conn_or_pool) as conn:
+            roles = await conn.fetch("""
+                SELECT name, role_id FROM roles
+            """)
+        _ROLE_CACHE.update((role['name'], role['role_id']) for role in roles)
+
+# Запросы, которые выполняются почти на каждый HTTP-запрос. Их текст вынесен
+# в константы, чтобы prewarm_connection() и функции ниже использовали одну и ту же
+# строку: кэш подготовленных операторов asyncpg ищет запрос по его тексту
+_USER_ROLES_SQL = """
+    SELECT r.name
+    FROM user_roles ur
+    JOIN roles r ON ur.role_id = r.role_id
+    WHERE ur.user_id = $1
+"""
+
+_USER_BY_EMAIL_SQL = """
+    SELECT user_id, username, hashed_password
+    FROM users
+    WHERE lower(email) = lower($1)
+    LIMIT 1
+"""
+
+_CART_ITEMS_SQL = """
+    SELECT product_id, name, description, price, stock, quantity, total_cost
+    FROM cart_details
+    WHERE user_id = $1
+"""
+
+_HOT_QUERIES = (
+    (_USER_ROLES_SQL, (uuid.UUID(int=0),)),
+    (_USER_BY_EMAIL_SQL, ('',)),
+    (_CART_ITEMS_SQL, (uuid.UUID(int=0),)),
+)
+
+async def prewarm_connection(conn: asyncpg.Connection):
+    """
+    Подготовить самые частые запросы на новом соединении пула.
+    Используется как init-callback asyncpg.create_pool: каждый запрос выполняется
+    один раз с заведомо пустым результатом, после чего его план уже лежит
+    в кэше операторов соединения и первый реальный вызов обходится без Parse/Describe.
+    """
+    for query, args in _HOT_QUERIES:
+        await conn.fetch(query, *args)
+
+async def get_all_products(conn_or_pool, limit: int = 50, after_name: str = None, after_id: uuid.UUID = None):
+    """
+    Получить страницу продуктов, упорядоченных по названию.
+    Следующая страница начинается после товара (after_name, after_id).
+    """
+    async with _acquire(conn_or_pool) as conn:
         return await conn.fetch("""
-            SELECT product_id, name, description, price, stock, manufacturer
+            SELECT product_id, name, description, price, stock, manufacturer, avg_rating, review_count
             FROM products
-        """)
+            WHERE $2::text IS NULL OR (name, product_id) > ($2, $3::uuid)
+            ORDER BY name, product_id
+            LIMIT $1
+        """, limit, after_name, after_id)
 
-async def get_role_id_by_name(pool: asyncpg.pool.Pool, role_name: str) -> int:
+async def get_role_id_by_name(conn_or_pool: ConnOrPool, role_name: str) -> int:
     """
     Получить ID роли по её имени.
     """
-    async with pool.acquire() as conn:
-        role_id = await conn.fetchval("""
-            SELECT role_id FROM roles WHERE name = $1
-        """, role_name)
-        if not role_id:
-            logger.error(f"Роль с именем {role_name} не найдена.")
-        return role_id
+    await _ensure_roles(conn_or_pool)
+    role_id = _ROLE_CACHE.get(role_name)
+    if not role_id:
+        logger.error(f"Роль с именем {role_name} не найдена.")
+    return role_id
 
-async def get_user_roles(pool: asyncpg.pool.Pool, user_id: str):
+async def get_user_roles(conn_or_pool: ConnOrPool, user_id: uuid.UUID):
     """
     Получить список ролей пользователя.
     """
-    async with pool.acquire() as conn:
-        roles = await conn.fetch("""
-            SELECT r.name
-            FROM user_roles ur
-            JOIN roles r ON ur.role_id = r.role_id
-            WHERE ur.user_id = $1
-        """, user_id)
+    async with _acquire(conn_or_pool) as conn:
+        roles = await conn.fetch(_USER_ROLES_SQL, user_id)
         return [role['name'] for role in roles]
 
-async def get_user_by_id(pool: asyncpg.pool.Pool, user_id: str):
+async def get_user_by_id(conn_or_pool: ConnOrPool, user_id: uuid.UUID):
     """
     Получить информацию о пользователе по user_id.
     """
-    async with pool.acquire() as conn:
+    async with _acquire(conn_or_pool) as conn:
         return await conn.fetchrow("""
             SELECT username, email
             FROM users
             WHERE user_id = $1
         """, user_id)
 
-async def create_user(pool: asyncpg.pool.Pool, username: str, hashed_password: str, email: str):
+async def create_user(conn_or_pool: ConnOrPool, username: str, hashed_password: str, email: str):
     """
     Создать нового пользователя и вернуть его user_id.
     """
-    user_id = uuid.uuid4()
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            INSERT INTO users (user_id, username, hashed_password, email)
-            VALUES ($1, $2, $3, $4)
-        """, user_id, username, hashed_password, email)
-
-        role_id = await get_role_id_by_name(pool, "User")
-        await conn.execute("""
+    async with _acquire(conn_or_pool) as conn:
+        role_id = await get_role_id_by_name(conn, "User")
+        # Пользователь и его роль создаются одним запросом; если роль не найдена,
+        # вставка в user_roles нарушит NOT NULL и весь запрос будет отменён
+        return await conn.fetchval("""
+            WITH ins AS (
+                INSERT INTO users (user_id, username, hashed_password, email)
+                VALUES (uuid_generate_v4(), $1, $2, $3)
+                RETURNING user_id
+            )
             INSERT INTO user_roles (user_id, role_id)
-            VALUES ($1, $2)
-        """, user_id, role_id)
-    return user_id
+            SELECT ins.user_id, $4::int
+            FROM ins
+            RETURNING user_id
+        """, username, hashed_password, email, role_id)
 
-async def get_user_by_email(pool: asyncpg.pool.Pool, email: str):
+async def get_user_by_email(conn_or_pool: ConnOrPool, email: str):
     """
     Получить пользователя по email.
     """
-    async with pool.acquire() as conn:
-        return await conn.fetchrow("""
-            SELECT * FROM users WHERE email = $1
-        """, email)
+    async with _acquire(conn_or_pool) as conn:
+        return await conn.fetchrow(_USER_BY_EMAIL_SQL, email)
 
-async def get_product_by_id(pool: asyncpg.pool.Pool, product_id: str):
+async def get_product_by_id(conn_or_pool: ConnOrPool, product_id: uuid.UUID):
     """
     Получить информацию о продукте по его ID.
     """
-    async with pool.acquire() as conn:
+    async with _acquire(conn_or_pool) as conn:
         return await conn.fetchrow("""
-            SELECT * FROM products WHERE product_id = $1
+            SELECT product_id, name, description, price, stock, manufacturer, avg_rating, review_count
+            FROM products
+            WHERE product_id = $1
         """, product_id)
 
-async def add_to_cart(pool: asyncpg.pool.Pool, user_id: str, product_id: str, quantity: int):
+async def add_to_cart(conn_or_pool: ConnOrPool, user_id: uuid.UUID, product_id: uuid.UUID, quantity: int):
     """
     Добавить товар в корзину пользователя.
     """
-    async with pool.acquire() as conn:
-        # Проверяем, есть ли уже этот товар в корзине пользователя
-        existing = await conn.fetchrow("""
-            SELECT quantity FROM cart WHERE user_id = $1 AND product_id = $2
-        """, user_id, product_id)
-
-        if existing:
-            # Обновляем количество товара в корзине
-            await conn.execute("""
-                UPDATE cart SET quantity = quantity + $1 WHERE user_id = $2 AND product_id = $3
-            """, quantity, user_id, product_id)
-        else:
-            # Добавляем новый товар в корзину
-            await conn.execute("""
-                INSERT INTO cart (user_id, product_id, quantity)
-                VALUES ($1, $2, $3)
-            """, user_id, product_id, quantity)
-
-async def get_cart_items(pool: asyncpg.pool.Pool, user_id: str):
+    async with _acquire(conn_or_pool) as conn:
+        # Добавляем товар или увеличиваем его количество, если он уже в корзине
+        await conn.execute("""
+            INSERT INTO cart (user_id, product_id, quantity)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (user_id, product_id)
+            DO UPDATE SET quantity = cart.quantity + EXCLUDED.quantity
+        """, user_id, product_id, quantity)
+
+async def add_order_to_cart(conn_or_pool: ConnOrPool, user_id: uuid.UUID, order_id: uuid.UUID):
+    """
+    Добавить в корзину пользователя все товары из его заказа.
+    Возвращает число перенесённых позиций (0, если заказ не найден или чужой).
+    """
+    async with _acquire(conn_or_pool) as conn:
+        # Товары заказа переносятся в корзину одним запросом, без выборки в Python
+        status = await conn.execute("""
+            INSERT INTO cart (user_id, product_id, quantity)
+            SELECT o.user_id, oi.product_id, oi.quantity
+            FROM order_items oi
+            JOIN orders o ON o.order_id = oi.order_id
+            WHERE oi.order_id = $2 AND o.user_id = $1
+            ON CONFLICT (user_id, product_id)
+            DO UPDATE SET quantity = cart.quantity + EXCLUDED.quantity
+        """, user_id, order_id)
+        # Статус команды имеет вид "INSERT 0 <число строк>"
+        return int(status.split()[-1])
+
+async def get_cart_items(conn_or_pool: ConnOrPool, user_id: uuid.UUID):
     """
     Получить все товары в корзине пользователя.
     """
-    async with pool.acquire() as conn:
-        return await conn.fetch("""
-            SELECT product_id, name, description, price, stock, quantity, total_cost
-            FROM cart_details
-            WHERE user_id = $1
-        """, user_id)
+    async with _acquire(conn_or_pool) as conn:
+        return await conn.fetch(_CART_ITEMS_SQL, user_id)
 
 
 
-async def remove_from_cart(pool: asyncpg.pool.Pool, user_id: str, product_id: str):
+async def remove_from_cart(conn_or_pool: ConnOrPool, user_id: uuid.UUID, product_id: uuid.UUID):
     """
     Удалить товар из корзины пользователя.
     """
-    async with pool.acquire() as conn:
+    async with _acquire(conn_or_pool) as conn:
         await conn.execute("""
             DELETE FROM cart WHERE user_id = $1 AND product_id = $2
         """, user_id, product_id)
 
-async def update_cart_quantities(pool: asyncpg.pool.Pool, user_id: str, quantities: dict):
+async def update_cart_quantities(conn_or_pool: ConnOrPool, user_id: uuid.UUID, quantities: dict):
     """
     Обновить количество товаров в корзине пользователя.
     """
-    async with pool.acquire() as conn:
-        async with conn.transaction():
-            for product_id, quantity in quantities.items():
-                quantity = int(quantity)
-                if quantity <= 0:
-                    # Удаляем товар из корзины, если количество <= 0
-                    await conn.execute("""
-                        DELETE FROM cart WHERE user_id = $1 AND product_id = $2
-                    """, user_id, product_id)
-                else:
-                    # Проверяем доступность товара на складе
-                    stock = await conn.fetchval("""
-                        SELECT stock FROM products WHERE product_id = $1
-                    """, product_id)
-                    if quantity > stock:
-                        raise ValueError(f"Недостаточно товара на складе для продукта {product_id}")
-                    await conn.execute("""
-                        UPDATE cart SET quantity = $1 WHERE user_id = $2 AND product_id = $3
-                    """, quantity, user_id, product_id)
-
-async def get_last_orders(pool: asyncpg.pool.Pool, user_id: str):
+    product_ids = list(quantities.keys())
+    new_quantities = [int(quantity) for quantity in quantities.values()]
+    async with _acquire(conn_or_pool) as conn:
+        # Проверка остатков, удаление (количество <= 0) и обновление выполняются
+        # одним запросом; если хотя бы одного товара не хватает, корзина не меняется
+        missing_product = await conn.fetchval("""
+            WITH v AS (
+                SELECT * FROM unnest($2::uuid[], $3::int[]) AS v(product_id, quantity)
+            ),
+            bad AS (
+                SELECT v.product_id
+                FROM v
+                JOIN products p ON p.product_id = v.product_id
+                WHERE v.quantity > 0 AND v.quantity > p.stock
+            ),
+            del AS (
+                DELETE FROM cart c
+                USING v
+                WHERE c.user_id = $1 AND c.product_id = v.product_id
+                  AND v.quantity <= 0
+                  AND NOT EXISTS (SELECT 1 FROM bad)
+            ),
+            upd AS (
+                UPDATE cart c
+                SET quantity = v.quantity
+                FROM v
+                WHERE c.user_id = $1 AND c.product_id = v.product_id
+                  AND v.quantity > 0
+                  AND NOT EXISTS (SELECT 1 FROM bad)
+            )
+            SELECT product_id FROM bad LIMIT 1
+        """, user_id, product_ids, new_quantities)
+        if missing_product:
+            raise ValueError(f"Недостаточно товара на складе для продукта {missing_product}")
+
+async def get_last_orders(conn_or_pool: ConnOrPool, user_id: uuid.UUID):
     """
     Получить последние пять заказов пользователя.
     """
-    async with pool.acquire() as conn:
+    async with _acquire(conn_or_pool) as conn:
         return await conn.fetch("""
-            SELECT o.order_id, o.order_date, o.total_cost, ARRAY(
-                SELECT p.name
-                FROM order_items oi
-                JOIN products p ON oi.product_id = p.product_id
-                WHERE oi.order_id = o.order_id
-            ) AS products
-            FROM orders o
-            WHERE o.user_id = $1
+            SELECT o.order_id, o.order_date, o.total_cost,
+                   COALESCE(array_agg(p.name) FILTER (WHERE p.name IS NOT NULL), '{}') AS products
+            FROM (
+                SELECT order_id, order_date, total_cost
+                FROM orders
+                WHERE user_id = $1
+                ORDER BY order_date DESC
+                LIMIT 5
+            ) o
+            LEFT JOIN order_items oi ON oi.order_id = o.order_id
+            LEFT JOIN products p ON p.product_id = oi.product_id
+            GROUP BY o.order_id, o.order_date, o.total_cost
             ORDER BY o.order_date DESC
-            LIMIT 5
         """, user_id)
 
 
-async def process_order(pool: asyncpg.pool.Pool, user_id: str):
-    async with pool.acquire() as conn:
+async def process_order(conn_or_pool: ConnOrPool, user_id: uuid.UUID):
+    """
+    Оформить заказ из корзины пользователя.
+    Все операции выполняются на сервере за один запрос.
+    """
+    async with _acquire(conn_or_pool) as conn:
         # Вызов хранимой процедуры, которая сама проведет все операции
         await conn.execute("CALL process_user_order($1)", user_id)
 
-async def add_product(pool, name, description, price, stock, manufacturer, category_id=None):
-    async with pool.acquire() as conn:
+async def add_product(conn_or_pool, name, description, price, stock, manufacturer, category_id=None):
+    async with _acquire(conn_or_pool) as conn:
         await conn.execute("""
             INSERT INTO products (product_id, name, description, price, stock, manufacturer, category_id)
             VALUES (uuid_generate_v4(), $1, $2, $3, $4, $5, $6)
         """, name, description, price, stock, manufacturer, category_id)
 
-async def update_product(pool, product_id, name, description, price, stock, manufacturer, category_id=None):
-    async with pool.acquire() as conn:
+async def update_product(conn_or_pool: ConnOrPool, product_id: uuid.UUID, name: str, description: str, price: float, stock: int, manufacturer: str, category_id: str = None):
+    async with _acquire(conn_or_pool) as conn:
         await conn.execute("""
             UPDATE products
             SET name = $1, description = $2, price = $3, stock = $4, manufacturer = $5, category_id = $6
             WHERE product_id = $7
         """, name, description, price, stock, manufacturer, category_id, product_id)
 
-async def delete_product(pool, product_id):
-    async with pool.acquire() as conn:
+async def delete_product(conn_or_pool: ConnOrPool, product_id: uuid.UUID):
+    async with _acquire(conn_or_pool) as conn:
         await conn.execute("""
             DELETE FROM products WHERE product_id = $1
         """, product_id)
 
-async def get_all_products_with_categories(pool):
-    async with pool.acquire() as conn:
+async def get_all_products_with_categories(conn_or_pool, limit: int = 50, after_name: str = None, after_id: uuid.UUID = None):
+    """
+    Получить страницу товаров с названиями категорий, упорядоченных по названию.
+    Следующая страница начинается после товара (after_name, after_id).
+    """
+    async with _acquire(conn_or_pool) as conn:
         return await conn.fetch("""
-            SELECT p.*, c.name AS category_name
+            SELECT p.product_id, p.name, p.description, p.category_id, p.price, p.stock, p.manufacturer,
+                   c.name AS category_name
             FROM products p
             LEFT JOIN categories c ON p.category_id = c.category_id
-            ORDER BY p.name
-        """)
+            WHERE $2::text IS NULL OR (p.name, p.product_id) > ($2, $3::uuid)
+            ORDER BY p.name, p.product_id
+            LIMIT $1
+        """, limit, after_name, after_id)
 
-async def get_all_orders(pool):
-    async with pool.acquire() as conn:
+async def get_all_orders(conn_or_pool, limit: int = 50, after_date=None, after_id: uuid.UUID = None):
+    """
+    Получить страницу заказов, начиная с самых новых.
+    Следующая страница начинается после заказа (after_date, after_id).
+    """
+    async with _acquire(conn_or_pool) as conn:
         return await conn.fetch("""
-            SELECT o.order_id, o.user_id, u.username, o.total_cost, o.order_date, o.status
+            SELECT o.order_id, u.username, o.total_cost, o.order_date, o.status
             FROM orders o
             JOIN users u ON o.user_id = u.user_id
-            ORDER BY o.order_date DESC
-        """)
-
-async def update_order_status(pool, order_id, new_status):
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            UPDATE orders SET status = $1 WHERE order_id = $2
-        """, new_status, order_id)
+            WHERE $2::timestamp IS NULL OR (o.order_date, o.order_id) < ($2, $3::uuid)
+            ORDER BY o.order_date DESC, o.order_id DESC
+            LIMIT $1
+        """, limit, after_date, after_id)
 
-async def get_product_by_id(pool: asyncpg.pool.Pool, product_id: str):
+async def update_order_status(conn_or_pool, order_id, new_status):
     """
-    Получить информацию о продукте по его ID.
+    Изменить статус заказа. Запись в order_history добавляет триггер
+    order_history_trigger. Возвращает order_id, если статус изменился, иначе None.
     """
-    async with pool.acquire() as conn:
-        return await conn.fetchrow("""
-            SELECT * FROM products WHERE product_id = $1
-        """, product_id)
+    async with _acquire(conn_or_pool) as conn:
+        # Не трогаем заказ, если статус тот же: иначе триггер запишет в историю дубликат
+        return await conn.fetchval("""
+            UPDATE orders SET status = $1
+            WHERE order_id = $2 AND status IS DISTINCT FROM $1
+            RETURNING order_id
+        """, new_status, order_id)
 
-async def add_review(pool: asyncpg.pool.Pool, product_id: str, user_id: str, rating: int, comment: str):
+async def add_review(conn_or_pool: ConnOrPool, product_id: uuid.UUID, user_id: uuid.UUID, rating: int, comment: str):
     """
     Добавить отзыв к товару.
     """
-    async with pool.acquire() as conn:
+    async with _acquire(conn_or_pool) as conn:
         await conn.execute("""
             INSERT INTO reviews (product_id, user_id, rating, comment)
             VALUES ($1, $2, $3, $4)
         """, product_id, user_id, rating, comment)
 
-async def get_reviews_by_product_id(pool: asyncpg.pool.Pool, product_id: str):
+async def get_reviews_by_product_id(conn_or_pool: ConnOrPool, product_id: uuid.UUID):
     """
     Получить все отзывы для данного товара.
     """
-    async with pool.acquire() as conn:
+    async with _acquire(conn_or_pool) as conn:
         return await conn.fetch("""
-            SELECT r.*, u.username
+            SELECT r.review_id, r.rating, r.comment, r.review_date, u.username
             FROM reviews r
             JOIN users u ON r.user_id = u.user_id
             WHERE r.product_id = $1
             ORDER BY r.review_date DESC
         """, product_id)
 
-async def get_average_rating(pool: asyncpg.pool.Pool, product_id: str):
-    async with pool.acquire() as conn:
+async def get_average_rating(conn_or_pool: ConnOrPool, product_id: uuid.UUID):
+    """
+    Получить среднюю оценку товара (поддерживается триггером на reviews).
+    """
+    async with _acquire(conn_or_pool) as conn:
         return await conn.fetchval("""
-            SELECT get_average_product_rating($1)
+            SELECT avg_rating FROM products WHERE product_id = $1
         """, product_id)
 
-async def search_products(pool: asyncpg.pool.Pool, query: str = '', category_id: str = '', manufacturer: str = ''):
+async def search_products(conn_or_pool: ConnOrPool, query: str = '', category_id: str = '', manufacturer: str = ''):
     """
     Поиск товаров по названию, описанию, категории и производителю.
+
+    Вызывать с пулом app.search_pool: его соединения работают с
+    plan_cache_mode = force_custom_plan, и план строится под переданные
+    значения, так что незаполненные фильтры полностью выпадают из него.
+    В общем (generic) плане они остались бы условиями, скрывающими индексы.
     """
-    async with pool.acquire() as conn:
-        sql = """
+    async with _acquire(conn_or_pool) as conn:
+        # Один и тот же текст запроса для любой комбинации фильтров:
+        # незаполненный фильтр передаётся как '' / NULL и отключает своё условие
+        return await conn.fetch("""
             SELECT p.product_id, p.name, p.description, p.price, p.stock, p.manufacturer, c.name AS category_name
             FROM products p
             LEFT JOIN categories c ON p.category_id = c.category_id
-            WHERE TRUE
-        """
-        params = []
-        param_index = 1
-
-        if query:
-            sql += f" AND (p.name ILIKE '%' || ${param_index} || '%' OR p.description ILIKE '%' || ${param_index} || '%')"
-            params.append(query)
-            param_index += 1
-
-        if category_id:
-            sql += f" AND p.category_id = ${param_index}"
-            params.append(category_id)
-            param_index += 1
-
-        if manufacturer:
-            sql += f" AND p.manufacturer = ${param_index}"
-            params.append(manufacturer)
-            param_index += 1
-
-        sql += " ORDER BY p.name"
-
-        return await conn.fetch(sql, *params)
+            WHERE ($1::text = ''
+                   OR p.name ILIKE '%' || $1 || '%'
+                   OR p.description ILIKE '%' || $1 || '%')
+              AND ($2::uuid IS NULL OR p.category_id = $2)
+              AND ($3::text IS NULL OR p.manufacturer = $3)
+            ORDER BY p.name
+        """, query or '', category_id or None, manufacturer or None)
 
-async def get_all_categories(pool: asyncpg.pool.Pool):
+async def get_all_categories(conn_or_pool: ConnOrPool):
     """
     Получить список всех категорий.
     """
-    async with pool.acquire() as conn:
+    async with _acquire(conn_or_pool) as conn:
         return await conn.fetch("""
             SELECT category_id, name
             FROM categories
             ORDER BY name
         """)
 
-async def get_all_manufacturers(pool: asyncpg.pool.Pool):
+async def get_all_manufacturers(conn_or_pool: ConnOrPool):
     """
     Получить список всех производителей.
     """
-    async with pool.acquire() as conn:
-        records = await conn.fetch("""
-            SELECT DISTINCT manufacturer
+    async with _acquire(conn_or_pool) as conn:
+        # Сервер сразу возвращает массив строк, который asyncpg декодирует
+        # в список без создания Record на каждую строку
+        return await conn.fetchval("""
+            SELECT COALESCE(array_agg(DISTINCT manufacturer ORDER BY manufacturer), '{}')
             FROM products
             WHERE manufacturer IS NOT NULL AND manufacturer != ''
-            ORDER BY manufacturer
         """)
-        # Преобразуем список записей в список строк
-        return [record['manufacturer'] for record in records]
 
 
-async def add_category(pool: asyncpg.pool.Pool, name: str):
-    async with pool.acquire() as conn:
+async def add_category(conn_or_pool: ConnOrPool, name: str):
+    async with _acquire(conn_or_pool) as conn:
         await conn.execute("""
             INSERT INTO categories (category_id, name)
             VALUES (uuid_generate_v4(), $1)
         """, name)
 
-async def update_category(pool: asyncpg.pool.Pool, category_id: str, name: str):
-    async with pool.acquire() as conn:
+async def update_category(conn_or_pool: ConnOrPool, category_id: str, name: str):
+    async with _acquire(conn_or_pool) as conn:
         await conn.execute("""
             UPDATE categories
             SET name = $1
             WHERE category_id = $2
         """, name, category_id)
 
-async def delete_category(pool: asyncpg.pool.Pool, category_id: str):
-    async with pool.acquire() as conn:
+async def delete_category(conn_or_pool: ConnOrPool, category_id: str):
+    async with _acquire(conn_or_pool) as conn:
         await conn.execute("""
             DELETE FROM categories WHERE category_id = $1
         """, category_id)
\ No newline at end of file
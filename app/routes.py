@@ -1,7 +1,8 @@
 from quart import Blueprint, render_template, request, redirect, url_for, flash, current_app, session, abort
 from app.db import *
-import bcrypt
+from app.utils import hash_password, check_password
 import logging
+import uuid
 from quart import g
 
 logger = logging.getLogger(__name__)
@@ -9,9 +10,12 @@ main = Blueprint("main", __name__)
 
 @main.before_app_request
 async def load_user_roles():
+    # В сессии user_id хранится строкой; преобразуем его в UUID один раз на запрос,
+    # чтобы asyncpg передавал параметр в бинарном виде без разбора текста
     user_id = session.get('user_id')
-    if user_id:
-        g.user_roles = await get_user_roles(current_app.db_pool, user_id)
+    g.user_id = uuid.UUID(user_id) if user_id else None
+    if g.user_id:
+        g.user_roles = await get_user_roles(current_app.db_pool, g.user_id)
     else:
         g.user_roles = []
 
@@ -30,7 +34,7 @@ async def home():
         manufacturers = await get_all_manufacturers(current_app.db_pool)
 
         products = await search_products(
-            current_app.db_pool,
+            current_app.search_pool,
             query=query,
             category_id=category_id,
             manufacturer=manufacturer
@@ -58,7 +62,7 @@ async def profile():
     """
     Страница профиля пользователя.
     """
-    user_id = session.get("user_id")
+    user_id = g.user_id
     if not user_id:
         await flash("Пожалуйста, войдите в систему.", "warning")
         return redirect(url_for("main.login"))
@@ -102,12 +106,12 @@ async def register():
             await flash("Все поля обязательны для заполнения!", "warning")
             return redirect(url_for("main.register"))
 
-        hashed_password = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+        hashed_password = await hash_password(password)
 
-        async with current_app.db_pool.acquire():
+        async with current_app.db_pool.acquire() as conn:
             try:
                 # Проверяем, существует ли пользователь с таким email
-                existing_user = await get_user_by_email(current_app.db_pool, email)
+                existing_user = await get_user_by_email(conn, email)
                 if existing_user:
                     logger.warning(f"Пользователь с email {email} уже существует.")
                     await flash("Пользователь с таким email уже существует.", "danger")
@@ -116,7 +120,7 @@ async def register():
                 # Получаем ID роли "User"
 
                 # Создаём пользователя
-                user_id = await create_user(current_app.db_pool, username, hashed_password, email)
+                user_id = await create_user(conn, username, hashed_password, email)
                 logger.info(f"Пользователь {email} успешно зарегистрирован с ID: {user_id}.")
 
                 await flash("Регистрация прошла успешно! Теперь вы можете войти.", "success")
@@ -152,8 +156,7 @@ async def login():
             return redirect(url_for("main.login"))
 
         # Проверяем пароль
-        hashed_password = user["hashed_password"]
-        if not bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("utf-8")):
+        if not await check_password(password, user["hashed_password"]):
             logger.warning(f"Неверный пароль для email {email}.")
             await flash("Неверный email или пароль.", "danger")
             return redirect(url_for("main.login"))
@@ -182,7 +185,7 @@ async def cart():
     """
     Страница корзины пользователя.
     """
-    user_id = session.get("user_id")
+    user_id = g.user_id
     if not user_id:
         await flash("Пожалуйста, войдите в систему.", "warning")
         return redirect(url_for("main.login"))
@@ -205,7 +208,7 @@ async def update_cart():
     """
     Обновить количество товаров в корзине.
     """
-    user_id = session.get("user_id")
+    user_id = g.user_id
     if not user_id:
         await flash("Пожалуйста, войдите в систему.", "warning")
         return redirect(url_for("main.login"))
@@ -218,6 +221,7 @@ async def update_cart():
             quantities[product_id] = form.get(key)
 
     try:
+        quantities = {uuid.UUID(product_id): quantity for product_id, quantity in quantities.items()}
         await update_cart_quantities(current_app.db_pool, user_id, quantities)
         await flash("Корзина обновлена.", "success")
     except Exception as e:
@@ -232,7 +236,7 @@ async def place_order():
     """
     Оформить заказ.
     """
-    user_id = session.get("user_id")
+    user_id = g.user_id
     if not user_id:
         await flash("Пожалуйста, войдите в систему.", "warning")
         return redirect(url_for("main.login"))
@@ -251,7 +255,7 @@ async def repeat_order():
     """
     Повторить заказ.
     """
-    user_id = session.get("user_id")
+    user_id = g.user_id
     if not user_id:
         await flash("Пожалуйста, войдите в систему.", "warning")
         return redirect(url_for("main.login"))
@@ -262,19 +266,11 @@ async def repeat_order():
         return redirect(url_for("main.profile"))
 
     try:
-        async with current_app.db_pool.acquire() as conn:
-            # Получаем товары из заказа
-            products = await conn.fetch("""
-                SELECT product_id, quantity
-                FROM order_items
-                WHERE order_id = $1
-            """, order_id)
-
-            # Добавляем товары в корзину
-            for product in products:
-                await add_to_cart(current_app.db_pool, user_id, product["product_id"], product["quantity"])
-
-        await flash("Заказ успешно добавлен в корзину.", "success")
+        order_id = uuid.UUID(order_id)
+        if await add_order_to_cart(current_app.db_pool, user_id, order_id):
+            await flash("Заказ успешно добавлен в корзину.", "success")
+        else:
+            await flash("Заказ не найден.", "warning")
     except Exception as e:
         current_app.logger.error(f"Ошибка при повторении заказа {order_id}: {e}")
         await flash("Произошла ошибка при повторении заказа.", "danger")
@@ -287,7 +283,7 @@ async def add_item_to_cart():
     """
     Добавить товар в корзину.
     """
-    user_id = session.get("user_id")
+    user_id = g.user_id
     if not user_id:
         await flash("Пожалуйста, войдите в систему, чтобы добавить товар в корзину.", "warning")
         return redirect(url_for("main.login"))
@@ -297,6 +293,7 @@ async def add_item_to_cart():
     quantity = int(form.get("quantity", 1))
 
     try:
+        product_id = uuid.UUID(product_id)
         # Проверяем, существует ли товар с таким ID
         product = await get_product_by_id(current_app.db_pool, product_id)
         if not product:
@@ -318,12 +315,12 @@ async def add_item_to_cart():
     # Возвращаем пользователя на предыдущую страницу
     return redirect(request.referrer or url_for("main.home"))
 
-@main.route("/cart/remove/<product_id>", methods=["POST"])
+@main.route("/cart/remove/<uuid:product_id>", methods=["POST"])
 async def remove_item_from_cart(product_id):
     """
     Удалить товар из корзины.
     """
-    user_id = session.get("user_id")
+    user_id = g.user_id
     if not user_id:
         await flash("Пожалуйста, войдите в систему.", "warning")
         return redirect(url_for("main.login"))
@@ -337,12 +334,12 @@ async def remove_item_from_cart(product_id):
 
     return redirect(url_for("main.cart"))
 
-@main.route("/product/<product_id>", methods=["GET", "POST"])
+@main.route("/product/<uuid:product_id>", methods=["GET", "POST"])
 async def product_page(product_id):
     """
     Страница товара с описанием и отзывами.
     """
-    user_id = session.get("user_id")
+    user_id = g.user_id
 
     if request.method == "POST":
         if not user_id:
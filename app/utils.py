@@ -1,11 +1,36 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
-from quart import session, redirect, url_for, flash, current_app
+from quart import redirect, url_for, flash, current_app, g
 from app.db import *
+import bcrypt
+
+# bcrypt занимает процессор на десятки миллисекунд, поэтому хэширование
+# выполняется в отдельных потоках, не блокируя цикл событий
+_BCRYPT_POOL = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="bcrypt")
+
+async def hash_password(password: str) -> str:
+    """
+    Получить bcrypt-хэш пароля.
+    """
+    loop = asyncio.get_running_loop()
+    hashed = await loop.run_in_executor(_BCRYPT_POOL, bcrypt.hashpw, password.encode("utf-8"), bcrypt.gensalt())
+    return hashed.decode("utf-8")
+
+async def check_password(password: str, hashed_password: str) -> bool:
+    """
+    Проверить пароль по bcrypt-хэшу.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _BCRYPT_POOL, bcrypt.checkpw, password.encode("utf-8"), hashed_password.encode("utf-8")
+    )
 
 def admin_required(func):
     @wraps(func)
     async def decorated_view(*args, **kwargs):
-        user_id = session.get('user_id')
+        user_id = g.user_id
         if not user_id:
             await flash("Пожалуйста, войдите в систему.", "warning")
             return redirect(url_for('main.login'))
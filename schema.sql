@@ -1,5 +1,6 @@
 -- Создание расширений
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 -- Таблица roles
 CREATE TABLE roles (
@@ -15,6 +16,9 @@ CREATE TABLE users (
     email VARCHAR(100) UNIQUE NOT NULL
 );
 
+-- Email уникален без учёта регистра; индекс используется при входе
+CREATE UNIQUE INDEX users_email_lower_uidx ON users (lower(email));
+
 -- Таблица user_roles
 CREATE TABLE user_roles (
     user_id UUID NOT NULL,
@@ -42,6 +46,10 @@ CREATE TABLE products (
     CONSTRAINT fk_products_categories FOREIGN KEY (category_id) REFERENCES categories(category_id) ON DELETE SET NULL
 );
 
+-- Триграммные индексы для поиска товаров по подстроке (ILIKE '%...%')
+CREATE INDEX products_name_trgm_idx ON products USING gin (name gin_trgm_ops);
+CREATE INDEX products_description_trgm_idx ON products USING gin (description gin_trgm_ops);
+
 -- Таблица cart
 CREATE TABLE cart (
     user_id UUID NOT NULL,
@@ -62,6 +70,9 @@ CREATE TABLE orders (
     CONSTRAINT fk_orders_users FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
 );
 
+-- Последние заказы пользователя читаются по индексу без сортировки
+CREATE INDEX orders_user_date_idx ON orders (user_id, order_date DESC) INCLUDE (order_id, total_cost);
+
 -- Таблица order_items
 CREATE TABLE order_items (
     order_id UUID NOT NULL,
@@ -94,6 +105,9 @@ CREATE TABLE reviews (
     CONSTRAINT fk_reviews_users FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
 );
 
+-- Отзывы товара в порядке даты
+CREATE INDEX reviews_product_date_idx ON reviews (product_id, review_date DESC);
+
 -- Заполнение таблиц тестовыми данными
 INSERT INTO roles (name) VALUES ('User'), ('Admin');
 
@@ -101,23 +115,39 @@ CREATE OR REPLACE PROCEDURE process_user_order(uid UUID)
 LANGUAGE plpgsql
 AS $$
 DECLARE
-    cart_item RECORD;
+    missing_product UUID;
     total_cost NUMERIC := 0;
-    order_id UUID := uuid_generate_v4();
+    v_order_id UUID := uuid_generate_v4();
 BEGIN
-    -- Получаем товары из корзины
-    FOR cart_item IN
-        SELECT product_id, quantity, price, stock
-        FROM cart_details
-        WHERE user_id = uid
-    LOOP
-        -- Проверяем наличие на складе
-        IF cart_item.quantity > cart_item.stock THEN
-            RAISE EXCEPTION 'Недостаточно товара на складе для продукта %', cart_item.product_id;
-        END IF;
-        -- Считаем итоговую стоимость
-        total_cost := total_cost + (cart_item.price * cart_item.quantity);
-    END LOOP;
+    -- Блокируем пользователя: FOR UPDATE конфликтует с блокировкой KEY SHARE,
+    -- которую внешний ключ берёт при каждой вставке в cart, поэтому новые товары
+    -- не появятся в корзине до конца транзакции
+    PERFORM 1 FROM users WHERE user_id = uid FOR UPDATE;
+
+    -- Блокируем строки корзины, чтобы их количество не изменилось между
+    -- проверкой, вставкой в order_items и очисткой корзины
+    PERFORM 1 FROM cart WHERE user_id = uid FOR UPDATE;
+
+    -- Блокируем товары корзины (в постоянном порядке, чтобы избежать взаимных
+    -- блокировок), чтобы два заказа не выкупили одну и ту же последнюю единицу
+    PERFORM 1
+    FROM products p
+    JOIN cart c ON c.product_id = p.product_id
+    WHERE c.user_id = uid
+    ORDER BY p.product_id
+    FOR UPDATE OF p;
+
+    -- Одним проходом по корзине считаем итоговую стоимость
+    -- и ищем товар, которого недостаточно на складе
+    SELECT COALESCE(SUM(cd.price * cd.quantity), 0),
+           (array_agg(cd.product_id) FILTER (WHERE cd.quantity > cd.stock))[1]
+    INTO total_cost, missing_product
+    FROM cart_details cd
+    WHERE cd.user_id = uid;
+
+    IF missing_product IS NOT NULL THEN
+        RAISE EXCEPTION 'Недостаточно товара на складе для продукта %', missing_product;
+    END IF;
 
     IF total_cost = 0 THEN
         RAISE EXCEPTION 'Корзина пуста.';
@@ -125,32 +155,72 @@ BEGIN
 
     -- Создаем новый заказ
     INSERT INTO orders (order_id, user_id, total_cost, order_date, status)
-    VALUES (order_id, uid, total_cost, NOW(), 'Pending');
-
-    -- Добавляем товары из корзины в order_items и обновляем остатки
-    FOR cart_item IN
-        SELECT product_id, quantity, price, stock
-        FROM cart_details
-        WHERE user_id = uid
-    LOOP
-        INSERT INTO order_items (order_id, product_id, quantity, price)
-        VALUES (order_id, cart_item.product_id, cart_item.quantity, cart_item.price);
-
-        UPDATE products SET stock = stock - cart_item.quantity WHERE product_id = cart_item.product_id;
-    END LOOP;
-
-    -- Очищаем корзину пользователя
-    DELETE FROM cart WHERE user_id = uid;
+    VALUES (v_order_id, uid, total_cost, NOW(), 'Pending');
+
+    -- Добавляем товары из корзины в order_items одним запросом
+    INSERT INTO order_items (order_id, product_id, quantity, price)
+    SELECT v_order_id, cd.product_id, cd.quantity, cd.price
+    FROM cart_details cd
+    WHERE cd.user_id = uid;
+
+    -- Списываем со склада ровно то, что попало в заказ
+    UPDATE products p
+    SET stock = p.stock - oi.quantity
+    FROM order_items oi
+    WHERE oi.order_id = v_order_id AND p.product_id = oi.product_id;
+
+    -- Очищаем корзину от оформленных товаров
+    DELETE FROM cart c
+    USING order_items oi
+    WHERE c.user_id = uid AND oi.order_id = v_order_id AND c.product_id = oi.product_id;
 END;
 $$;
 
-CREATE OR REPLACE FUNCTION get_average_product_rating(product_id UUID)
-RETURNS NUMERIC AS $$
+-- Средняя оценка и число отзывов товара, поддерживаются триггером на reviews.
+-- Для уже существующей базы этот блок можно выполнить отдельно: столбцы
+-- добавляются и заполняются по текущим отзывам до создания триггера
+ALTER TABLE products
+    ADD COLUMN IF NOT EXISTS avg_rating NUMERIC,
+    ADD COLUMN IF NOT EXISTS review_count INT NOT NULL DEFAULT 0;
+
+UPDATE products p
+SET avg_rating = s.avg_rating, review_count = s.review_count
+FROM (
+    SELECT product_id, AVG(rating) AS avg_rating, COUNT(*) AS review_count
+    FROM reviews
+    GROUP BY product_id
+) s
+WHERE p.product_id = s.product_id;
+
+CREATE OR REPLACE FUNCTION update_product_rating()
+RETURNS TRIGGER AS $$
 BEGIN
-    RETURN (SELECT AVG(rating)::NUMERIC FROM reviews WHERE product_id = product_id);
+    -- Убираем старую оценку из средней
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE products
+        SET avg_rating = CASE
+                WHEN review_count > 1
+                THEN (avg_rating * review_count - OLD.rating) / (review_count - 1)
+            END,
+            review_count = review_count - 1
+        WHERE product_id = OLD.product_id;
+    END IF;
+    -- Добавляем новую оценку в среднюю
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE products
+        SET avg_rating = (COALESCE(avg_rating, 0) * review_count + NEW.rating) / (review_count + 1),
+            review_count = review_count + 1
+        WHERE product_id = NEW.product_id;
+    END IF;
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
+CREATE TRIGGER product_rating_trigger
+   AFTER INSERT OR DELETE OR UPDATE OF rating, product_id ON reviews
+   FOR EACH ROW
+   EXECUTE FUNCTION update_product_rating();
+
 CREATE OR REPLACE FUNCTION log_order_history()
 RETURNS TRIGGER AS $$
 DECLARE